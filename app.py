@@ -4,10 +4,16 @@ import smtplib
 import qrcode
 import json
 import base64
+import threading
+import time
+import sqlite3
 from io import BytesIO
+from urllib.parse import urlencode
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, render_template, url_for, session, redirect, flash
+from flask import Flask, request, jsonify, render_template, url_for, session, redirect, flash, after_this_request
 from flask_cors import CORS
 from functools import wraps
 from oauth2client.service_account import ServiceAccountCredentials
@@ -45,6 +51,171 @@ GOOGLE_CREDENTIALS_BASE64 = os.getenv("GOOGLE_CREDENTIALS_BASE64")
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
 
+# Failure Log: worksheet (header row: Time | Task | Error) where failed emails / QR codes are appended.
+# Survives cold starts and is shared by every instance, so it is the recommended setup on Vercel.
+FAILED_TASKS_SHEET_ID = os.getenv("FAILED_TASKS_SHEET_ID", SHEET_ID)
+FAILED_TASKS_SHEET_NAME = os.getenv("FAILED_TASKS_SHEET_NAME")
+
+# Multi-lab / multi-room registry (JSON). Each entry is one storage shard, e.g.
+# LABS_CONFIG='{"cs-lab": {"name": "CS Lab", "sheet_id": "...", "sheet_name": "Bookings"}}'
+# EQUIPMENT_ROOMS_CONFIG='{"cs-room": {"name": "CS Room", "sheet_id": "...", "sheet_name": "Bookings", "inventory_sheet_name": "Inventory"}}'
+# When not set, the single SHEET_* / EQUIPMENT_SHEET_* variables above become the "default" shard.
+LABS_CONFIG = os.getenv("LABS_CONFIG")
+EQUIPMENT_ROOMS_CONFIG = os.getenv("EQUIPMENT_ROOMS_CONFIG")
+# Lab / room used by requests and links without an identifier (e.g. emails sent before multi-lab
+# support). Defaults to the "default" entry; set these when the registry has no such key.
+DEFAULT_LAB = os.getenv("DEFAULT_LAB", "default")
+DEFAULT_ROOM = os.getenv("DEFAULT_ROOM", "default")
+
+# Performance Config
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "30")) # How long a shard serves cached records
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8")) # Size of the shared thread pool for Sheets I/O
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4")) # Size of the pool for emails / QR codes
+# Send user notifications after the response instead of inline. Off by default on Vercel,
+# where the process is frozen once the response is sent and deferred work may never run.
+DEFER_SIDE_EFFECTS = os.getenv("DEFER_SIDE_EFFECTS", "0" if os.getenv("VERCEL") else "1") == "1"
+# SQLite file shared by every worker process on this machine. Set to "" to disable the shared tier.
+# Defaults to the app's own instance folder (never a world-writable temp dir). Disabled by default on
+# Vercel, whose filesystem is read-only and where each instance serves one request at a time anyway.
+SHARED_CACHE_PATH_IS_EXPLICIT = "SHARED_CACHE_PATH" in os.environ
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "" if os.getenv("VERCEL") else os.path.join(app.instance_path, "shared_cache.sqlite3"))
+FILL_LEASE_SECONDS = 10 # How long other workers wait for the one refilling an expired snapshot
+SHARED_ENTRY_MAX_AGE = 3600 # Entries older than this are pruned from the shared cache
+SHARED_CACHE_OPEN_ATTEMPTS = 5 # Startup retries before a worker refuses to run without the shared cache
+
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=IO_WORKERS)
+# Kept separate so a slow SMTP server can never starve request-path Sheets reads
+BACKGROUND_EXECUTOR = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS)
+
+# Recent side-effect failures, newest last (see /api/admin_failed_tasks). Last resort only, used
+# when neither the failure log worksheet nor the shared cache could take them: per instance and
+# best effort, lost on restart.
+FAILED_TASKS = deque(maxlen=100)
+FAILED_TASKS_LIMIT = 100 # How many failures the shared store keeps and the admin panel shows
+
+# --- SHARED CROSS-WORKER CACHE ---
+
+class SharedCache:
+    """
+    Cache shared by all worker processes on one machine, stored in a SQLite file in WAL mode.
+    Every key has a version stamp; a write in any worker bumps it, so the other workers
+    stop serving their copies on their next read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Only the app's user may read or write the cache; other local users could otherwise feed fake snapshots
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        conn = self._connect()
+        os.chmod(path, 0o600)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS versions (key TEXT PRIMARY KEY, version INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, version TEXT NOT NULL, stored_at REAL NOT NULL, payload TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS entries_stored_at ON entries (stored_at);
+            CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires_at REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS failed_tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, task TEXT NOT NULL, error TEXT NOT NULL, time TEXT NOT NULL);
+        """)
+
+    def _connect(self):
+        """Returns this thread's connection. Reconnects after a fork (e.g. gunicorn --preload)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def version(self, key):
+        """Returns the current version stamp of a key (0 if it was never written)."""
+        row = self._connect().execute("SELECT version FROM versions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, key):
+        """Invalidates a key for every worker."""
+        self._connect().execute(
+            "INSERT INTO versions (key, version) VALUES (?, 1) "
+            "ON CONFLICT(key) DO UPDATE SET version = version + 1", (key,))
+
+    def get(self, key, version, max_age):
+        """Returns (payload, stored_at) if the entry matches `version` and is younger than `max_age`."""
+        row = self._connect().execute(
+            "SELECT version, stored_at, payload FROM entries WHERE key = ?", (key,)).fetchone()
+        if row and row[0] == str(version) and time.time() - row[1] < max_age:
+            return json.loads(row[2]), row[1]
+        return None
+
+    def put(self, key, version, payload):
+        """Stores an entry under `version` and prunes old entries."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO entries (key, version, stored_at, payload) VALUES (?, ?, ?, ?)",
+                     (key, str(version), now, json.dumps(payload)))
+        conn.execute("DELETE FROM entries WHERE stored_at < ?", (now - SHARED_ENTRY_MAX_AGE,))
+
+    def acquire_fill_lease(self, key):
+        """Returns True for exactly one caller at a time, which should then refill the entry."""
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO leases (key, expires_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at WHERE leases.expires_at <= ?",
+            (key, now + FILL_LEASE_SECONDS, now))
+        return cursor.rowcount == 1
+
+    def release_fill_lease(self, key):
+        """Releases a fill lease. Only the caller that acquired it may call this."""
+        self._connect().execute("DELETE FROM leases WHERE key = ?", (key,))
+
+    def record_failure(self, task, error, failed_at):
+        """Records a failed side effect, keeping only the newest FAILED_TASKS_LIMIT entries."""
+        conn = self._connect()
+        conn.execute("INSERT INTO failed_tasks (task, error, time) VALUES (?, ?, ?)", (task, error, failed_at))
+        conn.execute("DELETE FROM failed_tasks WHERE id <= (SELECT MAX(id) FROM failed_tasks) - ?", (FAILED_TASKS_LIMIT,))
+        return True
+
+    def recent_failures(self):
+        """Returns the recorded side-effect failures, newest last."""
+        rows = self._connect().execute("SELECT task, error, time FROM failed_tasks ORDER BY id").fetchall()
+        return [{'task': task, 'error': error, 'time': failed_at} for task, error, failed_at in rows]
+
+def open_shared_cache():
+    """
+    Opens the shared cache (None when SHARED_CACHE_PATH is empty). Retries briefly, e.g. while
+    another worker holds a lock at startup. If SHARED_CACHE_PATH was set explicitly it then raises:
+    a worker running without the shared tier would never bump its version stamps and the others
+    would keep serving stale snapshots. The default path is best effort: when it is not writable
+    (e.g. a read-only container), every worker fails the same way and runs with the tier off.
+    """
+    if not SHARED_CACHE_PATH:
+        return None
+    for attempt in range(1, SHARED_CACHE_OPEN_ATTEMPTS + 1):
+        try:
+            cache = SharedCache(SHARED_CACHE_PATH)
+            print(f"Shared cache ready at {SHARED_CACHE_PATH}.")
+            return cache
+        except (sqlite3.Error, OSError) as e:
+            last_error = e
+            print(f"Shared cache not ready (attempt {attempt}/{SHARED_CACHE_OPEN_ATTEMPTS}): {e}")
+            if attempt < SHARED_CACHE_OPEN_ATTEMPTS:
+                time.sleep(0.5 * attempt)
+    if not SHARED_CACHE_PATH_IS_EXPLICIT:
+        print(f"FAILED TO OPEN the default shared cache, using per-process caching only: {last_error}")
+        return None
+    raise RuntimeError(f"FATAL: Could not open the shared cache at {SHARED_CACHE_PATH}: {last_error}. "
+                       "Fix the path or set SHARED_CACHE_PATH=\"\" to disable it on every worker.")
+
+SHARED_CACHE = open_shared_cache()
+
+def shared_call(fn, *args, default=None):
+    """Calls into the shared cache, treating SQLite errors as a miss so requests never fail on it."""
+    try:
+        return fn(*args)
+    except sqlite3.Error as e:
+        print(f"Shared cache error ({fn.__name__}): {e}")
+        return default
+
 # --- GOOGLE SHEETS CONNECTION ---
 
 def get_google_creds():
@@ -59,8 +230,8 @@ def get_google_creds():
         print(f"FATAL: Failed to decode GOOGLE_CREDENTIALS_BASE64: {e}")
         return None
 
-def get_lab_booking_sheet():
-    """Connects to the Lab Booking Google Sheet."""
+def open_worksheet(sheet_id, sheet_name, label):
+    """Connects to one worksheet of a Google Sheet."""
     try:
         creds_dict = get_google_creds()
         if not creds_dict:
@@ -69,51 +240,284 @@ def get_lab_booking_sheet():
         scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
         creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
         client = gspread.authorize(creds)
-        sheet = client.open_by_key(SHEET_ID).worksheet(SHEET_NAME)
-        print("Successfully connected to Google Sheets (Lab Booking).")
+        sheet = client.open_by_key(sheet_id).worksheet(sheet_name)
+        print(f"Successfully connected to Google Sheets ({label}).")
         return sheet
     except Exception as e:
-        print(f"FAILED TO CONNECT to Google Sheets (Lab Booking): {e}")
+        print(f"FAILED TO CONNECT to Google Sheets ({label}): {e}")
         return None
 
-def get_equipment_sheet():
-    """Connects to the Equipment Booking Google Sheet."""
-    try:
-        creds_dict = get_google_creds()
-        if not creds_dict:
-            raise ValueError("Google credentials are not valid.")
-            
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        # Menggunakan ID dan Nama Sheet yang baru
-        sheet = client.open_by_key(EQUIPMENT_SHEET_ID).worksheet(EQUIPMENT_SHEET_NAME)
-        print("Successfully connected to Google Sheets (Equipment Booking).")
+class SheetShard:
+    """One worksheet (a lab's bookings, a room's bookings or inventory) with its own cache and indexes."""
+
+    def __init__(self, shard_id, name, sheet_id, sheet_name, label):
+        self.shard_id = shard_id
+        self.name = name
+        self.sheet_id = sheet_id
+        self.sheet_name = sheet_name
+        self.label = f"{label}: {shard_id}"
+        self.cache_key = f"sheet:{sheet_id}:{sheet_name}"
+        self._lock = threading.Lock()
+        self._handles = threading.local() # One worksheet per thread: a gspread session is not thread-safe
+        self._records = None
+        self._version = 0
+        self._generation = 0 # Bumped by invalidate(); reads started before a write are not kept
+        self._loaded_at = 0.0
+        self._indexes = {}
+
+    def worksheet(self):
+        """Returns this thread's worksheet handle, connecting on first use (outside the shard lock)."""
+        sheet = getattr(self._handles, 'sheet', None)
+        if sheet is None:
+            sheet = open_worksheet(self.sheet_id, self.sheet_name, self.label)
+            self._handles.sheet = sheet
         return sheet
+
+    def version(self):
+        """Returns the shard's version stamp, shared by all workers when the shared cache is enabled."""
+        if not SHARED_CACHE:
+            return self._version
+        return shared_call(SHARED_CACHE.version, self.cache_key, default=self._version)
+
+    def get_records(self, fresh=False):
+        """
+        Returns all records. Looks in this process's snapshot first, then in the shared cache,
+        and only then reads Google Sheets. A snapshot is served while it is younger than
+        CACHE_TTL_SECONDS and no worker has written to the sheet since.
+        """
+        with self._lock:
+            generation = self._generation
+        version = self.version()
+        if not fresh:
+            with self._lock:
+                if (self._records is not None and self._version == version
+                        and time.time() - self._loaded_at < CACHE_TTL_SECONDS):
+                    return self._records
+            records, held_lease = self._load_shared(version, generation)
+            if records is not None:
+                return records
+            return self._fetch(version, generation, held_lease)
+        # Fresh reads never take the lease, so they must not release another worker's
+        return self._fetch(version, generation)
+
+    def _load_shared(self, version, generation):
+        """
+        Returns (records, held_lease). Records come from the shared snapshot for `version`, waiting
+        for another worker's refill if one is running. On a miss, held_lease tells whether this
+        caller took the fill lease and must release it once its own read finishes.
+        """
+        if not SHARED_CACHE:
+            return None, False
+        hit = shared_call(SHARED_CACHE.get, self.cache_key, version, CACHE_TTL_SECONDS)
+        deadline = time.time() + FILL_LEASE_SECONDS
+        while hit is None:
+            # Only one worker refills an expired snapshot; the others wait for its result
+            if shared_call(SHARED_CACHE.acquire_fill_lease, self.cache_key, default=True):
+                return None, True
+            if time.time() > deadline:
+                return None, False
+            time.sleep(0.1)
+            hit = shared_call(SHARED_CACHE.get, self.cache_key, version, CACHE_TTL_SECONDS)
+        records, stored_at = hit
+        self._remember(records, version, stored_at, generation)
+        return records, False
+
+    def _fetch(self, version, generation, held_lease=False):
+        """Reads the sheet from Google and publishes the snapshot to the other workers."""
+        try:
+            sheet = self.worksheet()
+            try:
+                if not sheet:
+                    raise Exception(f"Failed to connect to the {self.label} database.")
+                records = sheet.get_all_records()
+            except Exception:
+                # Drop the handle so the next call reconnects (e.g. after an expired token)
+                self._handles.sheet = None
+                raise
+            if SHARED_CACHE:
+                shared_call(SHARED_CACHE.put, self.cache_key, version, records)
+        finally:
+            if held_lease:
+                shared_call(SHARED_CACHE.release_fill_lease, self.cache_key)
+        self._remember(records, version, time.time(), generation)
+        return records
+
+    def _remember(self, records, version, loaded_at, generation):
+        """Keeps a snapshot, unless this process wrote to the sheet after the read started."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._records = records
+            self._version = version
+            self._loaded_at = loaded_at
+            self._indexes = {}
+
+    def records_by(self, field, key, fresh=False, records=None):
+        """
+        Returns the records whose `field` equals `key`, using an index built once per snapshot.
+        Pass `records` to filter a snapshot the caller already holds without touching the cache.
+        """
+        if records is None:
+            records = self.get_records(fresh=fresh)
+        with self._lock:
+            if self._records is records and field in self._indexes:
+                return self._indexes[field].get(key, [])
+        index = {}
+        for record in records:
+            index.setdefault(str(record.get(field)), []).append(record)
+        with self._lock:
+            if self._records is records:
+                self._indexes[field] = index
+        return index.get(key, [])
+
+    def invalidate(self):
+        """Forgets cached records after a write, in this process and (via the version stamp) in every other worker."""
+        with self._lock:
+            self._generation += 1
+            self._records = None
+            self._indexes = {}
+        if SHARED_CACHE:
+            shared_call(SHARED_CACHE.bump, self.cache_key)
+
+class EquipmentRoom:
+    """An equipment room: a bookings shard and an inventory shard in the same spreadsheet."""
+
+    def __init__(self, room_id, name, sheet_id, sheet_name, inventory_sheet_name):
+        self.room_id = room_id
+        self.name = name
+        self.bookings = SheetShard(room_id, name, sheet_id, sheet_name, "Equipment Booking")
+        self.inventory = SheetShard(room_id, name, sheet_id, inventory_sheet_name, "Inventory")
+
+def load_registry(raw, env_name, fallback, required_fields):
+    """
+    Parses a JSON shard registry, falling back to the single-sheet configuration.
+    Entries that are not objects or miss one of `required_fields` are skipped.
+    """
+    if not raw:
+        return fallback
+    try:
+        registry = json.loads(raw)
+        if not isinstance(registry, dict) or not registry:
+            raise ValueError("expected a non-empty JSON object")
+    except ValueError as e:
+        print(f"FATAL: Failed to parse {env_name}, using the single-sheet configuration: {e}")
+        return fallback
+
+    valid = {}
+    for shard_id, cfg in registry.items():
+        if not isinstance(cfg, dict):
+            print(f"FATAL: Skipping {env_name} entry '{shard_id}': expected a JSON object")
+            continue
+        missing = [field for field in required_fields if not cfg.get(field)]
+        if missing:
+            print(f"FATAL: Skipping {env_name} entry '{shard_id}': missing {', '.join(missing)}")
+            continue
+        valid[shard_id] = cfg
+    if not valid:
+        print(f"FATAL: No valid entries in {env_name}, using the single-sheet configuration.")
+        return fallback
+    return valid
+
+def pick_default(registry, wanted, env_name):
+    """Returns the shard ID that requests without an identifier resolve to."""
+    if wanted in registry:
+        return wanted
+    first = next(iter(registry))
+    print(f"FATAL: {env_name} '{wanted}' is not in the registry; requests and old links without an ID will use '{first}'.")
+    return first
+
+LAB_SHARDS = {
+    lab_id: SheetShard(lab_id, cfg.get('name', lab_id), cfg.get('sheet_id'), cfg.get('sheet_name'), "Lab Booking")
+    for lab_id, cfg in load_registry(LABS_CONFIG, "LABS_CONFIG", {
+        'default': {'name': 'Lab', 'sheet_id': SHEET_ID, 'sheet_name': SHEET_NAME}
+    }, ['sheet_id', 'sheet_name']).items()
+}
+DEFAULT_LAB_ID = pick_default(LAB_SHARDS, DEFAULT_LAB, "DEFAULT_LAB")
+
+EQUIPMENT_ROOMS = {
+    room_id: EquipmentRoom(room_id, cfg.get('name', room_id), cfg.get('sheet_id'), cfg.get('sheet_name'), cfg.get('inventory_sheet_name'))
+    for room_id, cfg in load_registry(EQUIPMENT_ROOMS_CONFIG, "EQUIPMENT_ROOMS_CONFIG", {
+        'default': {'name': 'Equipment Room', 'sheet_id': EQUIPMENT_SHEET_ID,
+                    'sheet_name': EQUIPMENT_SHEET_NAME, 'inventory_sheet_name': INVENTORY_SHEET_NAME}
+    }, ['sheet_id', 'sheet_name', 'inventory_sheet_name']).items()
+}
+DEFAULT_ROOM_ID = pick_default(EQUIPMENT_ROOMS, DEFAULT_ROOM, "DEFAULT_ROOM")
+
+FAILED_TASKS_SHARD = (
+    SheetShard('failed-tasks', 'Failed Tasks', FAILED_TASKS_SHEET_ID, FAILED_TASKS_SHEET_NAME, "Failure Log")
+    if FAILED_TASKS_SHEET_ID and FAILED_TASKS_SHEET_NAME else None
+)
+
+def get_lab_shard(lab_id=None):
+    """Resolves a lab identifier to its shard (None if unknown). Missing IDs map to the default lab."""
+    return LAB_SHARDS.get(lab_id or DEFAULT_LAB_ID)
+
+def get_equipment_room(room_id=None):
+    """Resolves an equipment room identifier (None if unknown). Missing IDs map to the default room."""
+    return EQUIPMENT_ROOMS.get(room_id or DEFAULT_ROOM_ID)
+
+def fan_out(shards, fn):
+    """Calls fn(shard) for every shard in parallel on the shared pool, keeping shard order."""
+    if len(shards) == 1:
+        return [fn(shards[0])]
+    return list(IO_EXECUTOR.map(fn, shards))
+
+def run_concurrently(*calls):
+    """Runs independent blocking calls on the shared pool and returns their results in order.
+    Only call this from request threads, never from a task already running on IO_EXECUTOR."""
+    futures = [IO_EXECUTOR.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+# --- BACKGROUND SIDE EFFECTS ---
+
+def log_failure_to_sheet(description, error, failed_at):
+    """Appends a side-effect failure to the failure log worksheet. Returns False if that fails too."""
+    try:
+        sheet = FAILED_TASKS_SHARD.worksheet()
+        if not sheet:
+            return False
+        sheet.append_row([failed_at, description, error], value_input_option='RAW')
+        FAILED_TASKS_SHARD.invalidate()
+        return True
     except Exception as e:
-        print(f"FAILED TO CONNECT to Google Sheets (Equipment Booking): {e}")
-        return None
+        print(f"Failed to write to the failure log worksheet: {e}")
+        return False
 
-def get_inventory_sheet():
-    """Menghubungkan ke Google Sheets (Sheet Inventory)."""
+def run_side_effect(description, fn, *args, **kwargs):
+    """
+    Runs one side effect. If it raises, the failure is recorded in the failure log worksheet,
+    else in the shared cache, else (per instance, best effort) in FAILED_TASKS.
+    """
     try:
-        creds_dict = get_google_creds()
-        if not creds_dict:
-            raise ValueError("Google credentials are not valid.")
-            
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        # Membuka sheet 'Inventory' dari spreadsheet 'Equipment'
-        sheet = client.open_by_key(EQUIPMENT_SHEET_ID).worksheet(INVENTORY_SHEET_NAME)
-        print("Successfully connected to Google Sheets (Inventory).")
-        return sheet
+        fn(*args, **kwargs)
     except Exception as e:
-        print(f"FAILED TO CONNECT to Google Sheets (Inventory): {e}")
-        return None
+        print(f"Side effect failed ({description}): {e}")
+        failed_at = datetime.now().isoformat()
+        if FAILED_TASKS_SHARD and log_failure_to_sheet(description, str(e), failed_at):
+            return
+        if SHARED_CACHE and shared_call(SHARED_CACHE.record_failure, description, str(e), failed_at):
+            return
+        FAILED_TASKS.append({'task': description, 'error': str(e), 'time': failed_at})
+
+def defer_side_effect(description, fn, *args, **kwargs):
+    """
+    Schedules a non-critical side effect (email, QR code) to start once the response has been sent.
+    Runs it inline instead when DEFER_SIDE_EFFECTS is off.
+    """
+    if not DEFER_SIDE_EFFECTS:
+        run_side_effect(description, fn, *args, **kwargs)
+        return
+
+    @after_this_request
+    def schedule(response):
+        response.call_on_close(lambda: BACKGROUND_EXECUTOR.submit(run_side_effect, description, fn, *args, **kwargs))
+        return response
 
 # --- HELPER FUNCTIONS & EMAIL TEMPLATES ---
 
+# Statuses that still occupy a lab slot or equipment stock
+ACTIVE_STATUSES = ["Menunggu Persetujuan", "Disetujui", "Datang"]
+
 def time_to_minutes(time_str):
     """Converts 'HH:MM' time string to total minutes."""
     if isinstance(time_str, str) and ':' in time_str:
@@ -134,7 +538,7 @@ def parse_datetime_local(dt_str):
         return None
 
 def send_email(to_address, subject, html_body, qr_image_bytes=None):
-    """Sends an email with or without a QR code attachment."""
+    """Sends an email with or without a QR code attachment. Raises on failure."""
     try:
         port = int(SMTP_PORT or 587) # Default to port 587 if not set
         msg = MIMEMultipart('related')
@@ -158,17 +562,20 @@ def send_email(to_address, subject, html_body, qr_image_bytes=None):
             print(f"Email successfully sent to {to_address}")
     except Exception as e:
         print(f"Failed to send email: {e}")
+        raise
 
 # --- Email Templates (Lab Booking) ---
 
-def create_approval_email_body(data, row_id):
+def create_approval_email_body(data, row_id, lab):
     """Creates the HTML email body for lab booking approval."""
-    approve_url = f"{APP_URL}/approve?id={row_id}"
-    reject_url = f"{APP_URL}/reject?id={row_id}"
+    query = urlencode({'id': row_id, 'lab': lab.shard_id})
+    approve_url = f"{APP_URL}/approve?{query}"
+    reject_url = f"{APP_URL}/reject?{query}"
     
     return f"""
     <p>A new lab booking request has been submitted with the following details:</p>
     <ul>
+      <li><b>Lab:</b> {lab.name}</li>
       <li><b>Name:</b> {data.get('nama')}</li>
       <li><b>ID:</b> {data.get('idPengguna')}</li>
       <li><b>Email:</b> {data.get('emailPengguna')}</li>
@@ -194,6 +601,12 @@ def create_approved_email_body(user_data, checkin_url):
       <p>Or click this link: <a href="{checkin_url}">Manual Check-in Link</a></p></body></html>
     """
 
+def send_lab_approved_email(user_data, checkin_url):
+    """Renders the check-in QR code and emails it to the user."""
+    qr_img = qrcode.make(checkin_url); img_bytes = BytesIO(); qr_img.save(img_bytes, format='PNG')
+    email_body = create_approved_email_body(user_data, checkin_url)
+    send_email(user_data['emailPengguna'], "Your Lab Booking Has Been Approved!", email_body, qr_image_bytes=img_bytes.getvalue())
+
 def create_rejected_email_body(data):
     """Creates the HTML email body for a rejected lab booking."""
     formatted_date = datetime.strptime(data.get('tanggalBooking', ''), '%Y-%m-%d').strftime('%d/%m/%Y')
@@ -206,10 +619,11 @@ def create_rejected_email_body(data):
 
 # --- Email Templates (Equipment Booking) ---
 
-def create_equipment_approval_email(data, row_id):
+def create_equipment_approval_email(data, row_id, room):
     """Creates the HTML email body for equipment borrowing approval."""
-    approve_url = f"{APP_URL}/equipment_approve?id={row_id}"
-    reject_url = f"{APP_URL}/equipment_reject?id={row_id}"
+    query = urlencode({'id': row_id, 'room': room.room_id})
+    approve_url = f"{APP_URL}/equipment_approve?{query}"
+    reject_url = f"{APP_URL}/equipment_reject?{query}"
     
     items_list_html = ""
     try:
@@ -227,6 +641,7 @@ def create_equipment_approval_email(data, row_id):
     return f"""
     <p>A new equipment borrowing request has been submitted:</p>
     <ul>
+      <li><b>Room:</b> {room.name}</li>
       <li><b>Name:</b> {data.get('nama')}</li>
       <li><b>ID:</b> {data.get('idPengguna')}</li>
       <li><b>Email:</b> {data.get('emailPengguna')}</li>
@@ -282,12 +697,12 @@ def login_required(f):
 @app.route('/')
 def home():
     """Main route, shows the public dashboard."""
-    return render_template('dashboard.html')
+    return render_template('dashboard.html', labs=list(LAB_SHARDS.values()))
 
 @app.route('/dashboard')
 def dashboard():
     """Route for the public dashboard."""
-    return render_template('dashboard.html')
+    return render_template('dashboard.html', labs=list(LAB_SHARDS.values()))
 
 @app.route('/scan')
 def scan_qr():
@@ -321,26 +736,29 @@ def logout():
 @app.route('/booking')
 def booking_form():
     """Duplicate route for the lab booking form."""
-    return render_template('index.html')
+    return render_template('index.html', labs=list(LAB_SHARDS.values()))
 
 @app.route('/equipment')
 def equipment_booking_form():
     """Route for the public equipment booking form."""
-    return render_template('equipment_booking.html')
+    return render_template('equipment_booking.html', rooms=list(EQUIPMENT_ROOMS.values()))
 
 @app.route('/admin_panel')
 @login_required
 def admin_panel():
     """Displays the admin-only control panel."""
-    return render_template('admin_panel.html')
+    return render_template('admin_panel.html', labs=list(LAB_SHARDS.values()), rooms=list(EQUIPMENT_ROOMS.values()))
 
 # --- API ENDPOINTS ---
 
 # --- API (Lab Booking) ---
 @app.route('/api/getBookedSlots', methods=['GET'])
 def get_booked_slots():
-    """API to get booked lab slots for a specific date."""
-    sheet = get_lab_booking_sheet()
+    """API to get booked lab slots for a specific date in one lab."""
+    lab = get_lab_shard(request.args.get('lab'))
+    if not lab:
+        return jsonify({'status': 'gagal', 'message': 'Unknown lab'}), 404
+    sheet = lab.worksheet()
     if not sheet: 
         return jsonify({'status': 'gagal', 'message': 'Failed to connect to the database'}), 503
     try:
@@ -348,25 +766,35 @@ def get_booked_slots():
         if not tanggal: 
             return jsonify({'status': 'gagal', 'message': 'Date parameter not found'}), 400
         
-        all_records = sheet.get_all_records()
         booked_slots = [
             {'start': r.get('Waktu Mulai'), 'end': r.get('Waktu Selesai')} 
-            for r in all_records 
-            if str(r.get('Tanggal Booking')) == tanggal and r.get('Status') in ["Disetujui", "Menunggu Persetujuan", "Datang"]
+            for r in lab.records_by('Tanggal Booking', tanggal)
+            if r.get('Status') in ACTIVE_STATUSES
         ]
         return jsonify({'status': 'sukses', 'data': booked_slots})
     except Exception as e: 
         return jsonify({'status': 'gagal', 'message': str(e)}), 500
 
+def get_lab_dashboard_records(lab):
+    """Returns one lab's dashboard records, tagged with the lab they came from."""
+    return [
+        dict(record, **{'Lab': lab.shard_id, 'Lab Name': lab.name})
+        for record in lab.get_records() if record.get('ID Baris')
+    ]
+
 @app.route('/api/getDashboardData', methods=['GET'])
 def get_dashboard_data():
-    """API to get all data for the dashboard."""
-    sheet = get_lab_booking_sheet()
-    if not sheet: 
-        return jsonify({'status': 'gagal', 'message': 'Failed to connect to the database'}), 503
+    """API to get all data for the dashboard (one lab, or every lab when 'lab' is omitted or 'all')."""
+    lab_id = request.args.get('lab')
+    if lab_id and lab_id != 'all':
+        lab = get_lab_shard(lab_id)
+        if not lab:
+            return jsonify({'status': 'gagal', 'message': 'Unknown lab'}), 404
+        labs = [lab]
+    else:
+        labs = list(LAB_SHARDS.values())
     try:
-        all_records = sheet.get_all_records()
-        clean_records = [record for record in all_records if record.get('ID Baris')]
+        clean_records = [record for records in fan_out(labs, get_lab_dashboard_records) for record in records]
         return jsonify({'status': 'sukses', 'data': clean_records})
     except Exception as e:
         return jsonify({'status': 'gagal', 'message': str(e)}), 500
@@ -374,18 +802,20 @@ def get_dashboard_data():
 @app.route('/api/submitBooking', methods=['POST'])
 def handle_form_submission():
     """API to handle the public lab booking form submission."""
-    sheet = get_lab_booking_sheet()
+    lab = get_lab_shard(request.form.get('lab'))
+    if not lab:
+        return jsonify({'status': 'gagal', 'message': 'Unknown lab'}), 404
+    sheet = lab.worksheet()
     if not sheet: 
         return jsonify({'status': 'gagal', 'message': 'Failed to connect to the database'}), 503
     try:
         data = request.form.to_dict()
-        all_records = sheet.get_all_records()
         new_start = time_to_minutes(data['waktuMulai'])
         new_end = time_to_minutes(data['waktuSelesai'])
 
-        # Check for conflicts
-        for record in all_records:
-            if str(record.get('Tanggal Booking')) == data['tanggalBooking'] and record.get('Status') in ["Disetujui", "Menunggu Persetujuan", "Datang"]:
+        # Check for conflicts (always against a fresh read of this lab's sheet)
+        for record in lab.records_by('Tanggal Booking', data['tanggalBooking'], fresh=True):
+            if record.get('Status') in ACTIVE_STATUSES:
                 existing_start = time_to_minutes(record.get('Waktu Mulai'))
                 existing_end = time_to_minutes(record.get('Waktu Selesai'))
                 if new_start < existing_end and existing_start < new_end: 
@@ -405,9 +835,11 @@ def handle_form_submission():
             final_purpose, data.get('jumlahOrang', '1'), "Menunggu Persetujuan", row_id
         ]
         sheet.append_row(new_row, value_input_option='USER_ENTERED')
+        lab.invalidate()
         
-        email_body = create_approval_email_body(data, row_id)
-        send_email(LAB_HEAD_EMAIL, f"New Lab Booking Request: {data['nama']}", email_body)
+        email_body = create_approval_email_body(data, row_id, lab)
+        defer_side_effect(f"approval request email for {row_id}", send_email,
+                          LAB_HEAD_EMAIL, f"New Lab Booking Request ({lab.name}): {data['nama']}", email_body)
         
         return jsonify({'status': 'sukses', 'message': 'Booking request submitted successfully!'})
     except Exception as e: 
@@ -415,59 +847,82 @@ def handle_form_submission():
 
 # --- API (Equipment Booking) ---
 
-def get_available_stock(pickup_str, return_str):
+def get_available_stock(room, pickup_str, return_str, fresh=False):
     """
     Fungsi helper baru untuk menghitung stok yang tersedia berdasarkan tumpang tindih waktu.
+    Hanya membaca shard milik ruangan (room) yang diminta.
     """
     available_stock = {}
     
-    # 1. Dapatkan Master Stok
-    inv_sheet = get_inventory_sheet()
-    if not inv_sheet:
-        raise Exception("Failed to connect to inventory database.")
-    
-    inventory_records = inv_sheet.get_all_records()
+    # 1. Baca sheet Inventory dan sheet Booking secara bersamaan
+    inventory_records, booking_records = run_concurrently(
+        room.inventory.get_records,
+        lambda: room.bookings.get_records(fresh=fresh),
+    )
+
+    # 2. Dapatkan Master Stok
     master_stock = {item['ItemName']: int(item['TotalStock']) for item in inventory_records}
     available_stock = master_stock.copy()
 
-    # 2. Dapatkan Semua Booking Aktif
-    book_sheet = get_equipment_sheet()
-    if not book_sheet:
-        raise Exception("Failed to connect to bookings database.")
-    
-    booking_records = book_sheet.get_all_records()
+    # 3. Dapatkan Semua Booking Aktif
+    # Hanya booking yang sedang aktif atau menunggu persetujuan (lewat indeks Status).
+    # Selalu pakai snapshot yang baru saja dibaca, jangan baca cache lagi (bisa lebih lama).
+    active_bookings = [
+        booking for status in ACTIVE_STATUSES
+        for booking in room.bookings.records_by('Status', status, records=booking_records)
+    ]
 
-    # 3. Hitung Stok yang Digunakan
+    # 4. Hitung Stok yang Digunakan
     req_start = parse_datetime_local(pickup_str)
     req_end = parse_datetime_local(return_str)
 
-    for booking in booking_records:
-        status = booking.get('Status')
-        # Hanya cek booking yang sedang aktif atau menunggu persetujuan
-        if status in ["Menunggu Persetujuan", "Disetujui", "Datang"]:
-            try:
-                book_start = parse_datetime_local(booking.get('PickupTime'))
-                book_end = parse_datetime_local(booking.get('ReturnTime'))
-
-                # Cek tumpang tindih (overlap)
-                # (StartA < EndB) and (StartB < EndA)
-                if (req_start < book_end and book_start < req_end):
-                    # Ada overlap, kurangi stok
-                    items_borrowed = json.loads(booking.get('ItemsBorrowed', '{}'))
-                    for item_name, quantity in items_borrowed.items():
-                        if item_name in available_stock:
-                            available_stock[item_name] -= int(quantity)
-            except Exception as e:
-                print(f"Skipping row with invalid data (ID: {booking.get('ID Baris')}): {e}")
+    for booking in active_bookings:
+        try:
+            book_start = parse_datetime_local(booking.get('PickupTime'))
+            book_end = parse_datetime_local(booking.get('ReturnTime'))
+
+            # Cek tumpang tindih (overlap)
+            # (StartA < EndB) and (StartB < EndA)
+            if (req_start < book_end and book_start < req_end):
+                # Ada overlap, kurangi stok
+                items_borrowed = json.loads(booking.get('ItemsBorrowed', '{}'))
+                for item_name, quantity in items_borrowed.items():
+                    if item_name in available_stock:
+                        available_stock[item_name] -= int(quantity)
+        except Exception as e:
+            print(f"Skipping row with invalid data (ID: {booking.get('ID Baris')}): {e}")
 
     return available_stock
 
+def get_cached_available_stock(room, req_start, req_end):
+    """
+    Same as get_available_stock for two parsed datetimes, but the result is shared by all workers
+    until the room's inventory or bookings change (version stamps) or CACHE_TTL_SECONDS pass.
+    The key uses the normalized datetimes, so equivalent query strings share one entry.
+    Used for display only; submissions always recompute from fresh rows.
+    """
+    pickup_str = req_start.isoformat(timespec='minutes')
+    return_str = req_end.isoformat(timespec='minutes')
+    if not SHARED_CACHE:
+        return get_available_stock(room, pickup_str, return_str)
+    key = f"availability:{room.bookings.cache_key}:{pickup_str}:{return_str}"
+    version = f"{room.inventory.version()}.{room.bookings.version()}"
+    hit = shared_call(SHARED_CACHE.get, key, version, CACHE_TTL_SECONDS)
+    if hit is not None:
+        return hit[0]
+    available_stock = get_available_stock(room, pickup_str, return_str)
+    shared_call(SHARED_CACHE.put, key, version, available_stock)
+    return available_stock
+
 
 @app.route('/api/getEquipmentAvailability', methods=['GET'])
 def get_equipment_availability():
     """
     API BARU: Menghitung stok alat yang tersedia untuk rentang tanggal tertentu.
     """
+    room = get_equipment_room(request.args.get('room'))
+    if not room:
+        return jsonify({'status': 'gagal', 'message': 'Unknown equipment room'}), 404
     try:
         pickup_str = request.args.get('pickup')
         return_str = request.args.get('return_date')
@@ -475,7 +930,15 @@ def get_equipment_availability():
         if not pickup_str or not return_str:
             return jsonify({'status': 'gagal', 'message': 'Pickup and return dates are required.'}), 400
 
-        available_stock = get_available_stock(pickup_str, return_str)
+        try:
+            req_start = parse_datetime_local(pickup_str)
+            req_end = parse_datetime_local(return_str)
+        except ValueError:
+            req_start = req_end = None
+        if not req_start or not req_end:
+            return jsonify({'status': 'gagal', 'message': 'Invalid pickup or return date.'}), 400
+
+        available_stock = get_cached_available_stock(room, req_start, req_end)
         return jsonify({'status': 'sukses', 'data': available_stock})
 
     except Exception as e:
@@ -485,7 +948,10 @@ def get_equipment_availability():
 @app.route('/api/submitEquipmentBooking', methods=['POST'])
 def handle_equipment_submission():
     """API untuk menerima data formulir peminjaman alat (dengan validasi stok)."""
-    sheet = get_equipment_sheet()
+    room = get_equipment_room(request.form.get('room'))
+    if not room:
+        return jsonify({'status': 'gagal', 'message': 'Unknown equipment room'}), 404
+    sheet = room.bookings.worksheet()
     if not sheet: 
         return jsonify({'status': 'gagal', 'message': 'Failed to connect to the equipment database'}), 503
         
@@ -500,7 +966,7 @@ def handle_equipment_submission():
             return jsonify({'status': 'gagal', 'message': 'You must request at least one item.'}), 400
 
         # --- Validasi Stok Server-Side ---
-        available_stock = get_available_stock(req_start_str, req_end_str)
+        available_stock = get_available_stock(room, req_start_str, req_end_str, fresh=True)
 
         for item_name, quantity in items_requested_dict.items():
             if item_name not in available_stock:
@@ -522,9 +988,11 @@ def handle_equipment_submission():
         ]
         
         sheet.append_row(new_row, value_input_option='USER_ENTERED')
+        room.bookings.invalidate()
         
-        email_body = create_equipment_approval_email(data, row_id)
-        send_email(LAB_HEAD_EMAIL, f"New Equipment Borrowing Request: {data.get('nama')}", email_body)
+        email_body = create_equipment_approval_email(data, row_id, room)
+        defer_side_effect(f"equipment approval request email for {row_id}", send_email,
+                          LAB_HEAD_EMAIL, f"New Equipment Borrowing Request ({room.name}): {data.get('nama')}", email_body)
         
         return jsonify({'status': 'success', 'message': 'Equipment borrowing request submitted successfully!'})
     except Exception as e: 
@@ -536,7 +1004,10 @@ def handle_equipment_submission():
 @login_required
 def handle_admin_lab_booking():
     """API for admins to book a lab (auto-approved)."""
-    sheet = get_lab_booking_sheet()
+    lab = get_lab_shard(request.form.get('lab'))
+    if not lab:
+        return jsonify({'status': 'gagal', 'message': 'Unknown lab'}), 404
+    sheet = lab.worksheet()
     if not sheet: 
         return jsonify({'status': 'gagal', 'message': 'Failed to connect to the database'}), 503
     
@@ -557,6 +1028,7 @@ def handle_admin_lab_booking():
             row_id
         ]
         sheet.append_row(new_row, value_input_option='USER_ENTERED')
+        lab.invalidate()
         
         return jsonify({'status': 'success', 'message': 'Admin booking created and auto-approved!'})
     except Exception as e: 
@@ -566,7 +1038,10 @@ def handle_admin_lab_booking():
 @login_required
 def handle_admin_equipment_booking():
     """API for admins to borrow equipment (auto-approved, bypasses stock rules for "cannot-borrow" items)."""
-    sheet = get_equipment_sheet()
+    room = get_equipment_room(request.form.get('room'))
+    if not room:
+        return jsonify({'status': 'gagal', 'message': 'Unknown equipment room'}), 404
+    sheet = room.bookings.worksheet()
     if not sheet: 
         return jsonify({'status': 'gagal', 'message': 'Failed to connect to the equipment database'}), 503
     
@@ -589,13 +1064,40 @@ def handle_admin_equipment_booking():
         ]
         
         sheet.append_row(new_row, value_input_option='USER_ENTERED')
+        room.bookings.invalidate()
         
         return jsonify({'status': 'success', 'message': 'Admin equipment loan created and auto-approved!'})
     except Exception as e: 
         print(f"Error in adminEquipmentBooking: {e}")
         return jsonify({'status': 'gagal', 'message': str(e)}), 500
 
+@app.route('/api/admin_failed_tasks', methods=['GET'])
+@login_required
+def get_failed_tasks():
+    """
+    API for admins to see emails / QR codes that failed to send. 'scope' tells how complete the list is:
+    'sheet' and 'shared' cover every worker; 'instance' is only the instance that answered.
+    """
+    try:
+        failures = []
+        if FAILED_TASKS_SHARD:
+            failures = [
+                {'task': r.get('Task'), 'error': r.get('Error'), 'time': r.get('Time')}
+                for r in FAILED_TASKS_SHARD.get_records()[-FAILED_TASKS_LIMIT:]
+            ]
+        if SHARED_CACHE:
+            failures += shared_call(SHARED_CACHE.recent_failures, default=[]) or []
+        failures += list(FAILED_TASKS)
+        scope = 'sheet' if FAILED_TASKS_SHARD else 'shared' if SHARED_CACHE else 'instance'
+        return jsonify({'status': 'sukses', 'scope': scope, 'data': failures})
+    except Exception as e:
+        return jsonify({'status': 'gagal', 'message': str(e)}), 500
+
 # --- ACTION ROUTES (Lab Booking) ---
+
+# Status written to the sheet for each lab booking action
+LAB_ACTION_STATUSES = {'approve': "Disetujui", 'reject': "Ditolak", 'checkin': "Datang", 'checkout': "Selesai"}
+
 @app.route('/<action>', methods=['GET'])
 def handle_action(action):
     """Handles lab booking actions (approve, reject, checkin, checkout)."""
@@ -603,10 +1105,14 @@ def handle_action(action):
     if not row_id: 
         return "Error: ID not found.", 400
     
-    if action not in ['approve', 'reject', 'checkin', 'checkout']:
+    if action not in LAB_ACTION_STATUSES:
         return "Invalid action.", 400
 
-    sheet = get_lab_booking_sheet() 
+    # Links sent before multi-lab support carry no 'lab' and resolve to the default lab
+    lab = get_lab_shard(request.args.get('lab'))
+    if not lab:
+        return render_template('konfirmasi.html', message="Unknown lab.", status="gagal"), 404
+    sheet = lab.worksheet()
     if not sheet: 
         return render_template('konfirmasi.html', message="Failed to connect to the database.", status="gagal"), 503
 
@@ -622,28 +1128,28 @@ def handle_action(action):
             'waktuSelesai': row_values[6]
         }
         status_col = 10 # Status is in Column J
+        sheet.update_cell(cell.row, status_col, LAB_ACTION_STATUSES[action])
+        lab.invalidate()
         
         if action == 'approve':
-            sheet.update_cell(cell.row, status_col, "Disetujui")
-            checkin_url = f"{APP_URL}/checkin?id={row_id}"; qr_img = qrcode.make(checkin_url); img_bytes = BytesIO(); qr_img.save(img_bytes, format='PNG'); img_bytes.seek(0)
-            email_body = create_approved_email_body(user_data, checkin_url)
-            send_email(user_data['emailPengguna'], "Your Lab Booking Has Been Approved!", email_body, qr_image_bytes=img_bytes.read())
+            checkin_url = f"{APP_URL}/checkin?{urlencode({'id': row_id, 'lab': lab.shard_id})}"
+            defer_side_effect(f"approval email for {row_id}", send_lab_approved_email, user_data, checkin_url)
             message = f"Booking for {user_data['nama']} has been successfully APPROVED."
             return render_template('konfirmasi.html', message=message, status="sukses")
             
         elif action == 'reject':
-            sheet.update_cell(cell.row, status_col, "Ditolak"); email_body = create_rejected_email_body(user_data)
-            send_email(user_data['emailPengguna'], "Your Lab Booking Request Was Rejected", email_body)
+            email_body = create_rejected_email_body(user_data)
+            defer_side_effect(f"rejection email for {row_id}", send_email,
+                              user_data['emailPengguna'], "Your Lab Booking Request Was Rejected", email_body)
             message = f"Booking for {user_data['nama']} has been REJECTED."
             return render_template('konfirmasi.html', message=message, status="gagal")
 
         elif action == 'checkin':
-            sheet.update_cell(cell.row, status_col, "Datang"); tanggal = datetime.strptime(user_data['tanggalBooking'], '%Y-%m-%d').strftime('%d/%m/%Y')
+            tanggal = datetime.strptime(user_data['tanggalBooking'], '%Y-%m-%d').strftime('%d/%m/%Y')
             message = f"Check-in for {user_data['nama']} for the schedule {tanggal}, {user_data['waktuMulai']} - {user_data['waktuSelesai']} has been successful."
             return render_template('konfirmasi.html', message=message, status="sukses")
         
         elif action == 'checkout':
-            sheet.update_cell(cell.row, status_col, "Selesai")
             message = f"Check-out for {user_data['nama']} has been successful. Thank you!"
             return render_template('konfirmasi.html', message=message, status="sukses")
 
@@ -658,7 +1164,9 @@ def handle_equipment_approve():
     row_id = request.args.get('id')
     if not row_id: return "Error: ID not found.", 400
     
-    sheet = get_equipment_sheet()
+    room = get_equipment_room(request.args.get('room'))
+    if not room: return render_template('konfirmasi.html', message="Unknown equipment room.", status="gagal"), 404
+    sheet = room.bookings.worksheet()
     if not sheet: return render_template('konfirmasi.html', message="Failed to connect to the equipment database.", status="gagal"), 503
 
     try:
@@ -673,11 +1181,12 @@ def handle_equipment_approve():
             'returnDateTime': row_values[6]
         }
         status_col = 10 # Status is in Column J
-        
         sheet.update_cell(cell.row, status_col, "Disetujui")
+        room.bookings.invalidate()
         
         email_body = create_equipment_approved_email(user_data)
-        send_email(user_data['emailPengguna'], "Your Equipment Loan Has Been Approved!", email_body)
+        defer_side_effect(f"equipment approval email for {row_id}", send_email,
+                          user_data['emailPengguna'], "Your Equipment Loan Has Been Approved!", email_body)
         
         message = f"Equipment loan for {user_data['nama']} has been successfully APPROVED."
         return render_template('konfirmasi.html', message=message, status="sukses")
@@ -691,7 +1200,9 @@ def handle_equipment_reject():
     row_id = request.args.get('id')
     if not row_id: return "Error: ID not found.", 400
     
-    sheet = get_equipment_sheet()
+    room = get_equipment_room(request.args.get('room'))
+    if not room: return render_template('konfirmasi.html', message="Unknown equipment room.", status="gagal"), 404
+    sheet = room.bookings.worksheet()
     if not sheet: return render_template('konfirmasi.html', message="Failed to connect to the equipment database.", status="gagal"), 503
 
     try:
@@ -701,11 +1212,12 @@ def handle_equipment_reject():
         row_values = sheet.row_values(cell.row)
         user_data = {'nama': row_values[1], 'emailPengguna': row_values[3]}
         status_col = 10 # Status is in Column J
-        
         sheet.update_cell(cell.row, status_col, "Ditolak")
+        room.bookings.invalidate()
         
         email_body = create_equipment_rejected_email(user_data)
-        send_email(user_data['emailPengguna'], "Your Equipment Loan Request Was Rejected", email_body)
+        defer_side_effect(f"equipment rejection email for {row_id}", send_email,
+                          user_data['emailPengguna'], "Your Equipment Loan Request Was Rejected", email_body)
         
         message = f"Equipment loan for {user_data['nama']} has been REJECTED."
         return render_template('konfirmasi.html', message=message, status="gagal")
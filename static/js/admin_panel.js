@@ -76,5 +76,40 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // --- Widget 3: Failed Notifications ---
+    const failedTasksBody = document.querySelector('#failedTasksTable tbody');
+    const failedTasksScope = document.getElementById('failedTasksScope');
+
+    async function loadFailedTasks() {
+        try {
+            const response = await fetch('/api/admin_failed_tasks');
+            const result = await response.json();
+            if (result.status !== 'sukses') throw new Error(result.message);
+            // Tanpa worksheet atau shared cache, daftar ini hanya milik instance yang menjawab
+            failedTasksScope.classList.toggle('hidden', result.scope !== 'instance');
+
+            failedTasksBody.innerHTML = '';
+            if (result.data.length === 0) {
+                failedTasksBody.innerHTML = '<tr><td colspan="3">No failed notifications.</td></tr>';
+                return;
+            }
+            // Tampilkan yang terbaru di atas
+            result.data.slice().reverse().forEach(failure => {
+                const row = document.createElement('tr');
+                [failure.time, failure.task, failure.error].forEach(value => {
+                    const cell = document.createElement('td');
+                    cell.textContent = value;
+                    row.appendChild(cell);
+                });
+                failedTasksBody.appendChild(row);
+            });
+        } catch (error) {
+            console.error('Error fetching failed tasks:', error);
+            failedTasksBody.innerHTML = '<tr><td colspan="3">Failed to load failed notifications.</td></tr>';
+        }
+    }
+
+    loadFailedTasks();
+
 });
 
@@ -1,5 +1,7 @@
 document.addEventListener('DOMContentLoaded', function() {
     const API_URL = '/api/getDashboardData';
+    // Only rendered when more than one lab is configured
+    const labFilter = document.getElementById('labFilter');
     let charts = {};
     let lastData = []; // Store last fetched data for re-rendering
     // calendar state to support month navigation
@@ -14,7 +16,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
     async function updateDashboard() {
         try {
-            const response = await fetch(API_URL);
+            const lab = labFilter ? labFilter.value : 'all';
+            const response = await fetch(`${API_URL}?lab=${encodeURIComponent(lab)}`);
             const result = await response.json();
 
             if (result.status === 'sukses') {
@@ -43,7 +46,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const currentTime = now.getHours() * 60 + now.getMinutes();
         const todayStr = now.toISOString().split('T')[0];
 
-        const currentUser = data.find(booking => {
+        const currentUsers = data.filter(booking => {
             const bookingDate = booking ? booking['Tanggal Booking'] : null;
             const status = booking ? booking['Status'] : null;
             // Status yang dianggap sedang berjalan adalah "Disetujui" atau "Datang"
@@ -56,12 +59,18 @@ document.addEventListener('DOMContentLoaded', function() {
         });
 
         const statusEl = document.getElementById('current-status');
-        if (currentUser) {
+        if (currentUsers.length) {
+            // Sebut nama lab hanya jika dashboard menampilkan lebih dari satu lab
+            const lines = currentUsers.map(currentUser => {
+                const labName = labFilter ? currentUser['Lab Name'] : 'Lab';
+                return `${labName} is currently in use by <strong>${currentUser['Nama']}</strong> until ${currentUser['Waktu Selesai']}.`;
+            });
             statusEl.className = 'status-occupied';
-            statusEl.innerHTML = `<span class="status-icon">🔴</span> <span class="status-text">Lab is currently in use by <strong>${currentUser['Nama']}</strong> until ${currentUser['Waktu Selesai']}.</span>`;
+            statusEl.innerHTML = `<span class="status-icon">🔴</span> <span class="status-text">${lines.join('<br>')}</span>`;
         } else {
             statusEl.className = 'status-free';
-            statusEl.innerHTML = `<span class="status-icon">✅</span> <span class="status-text">The lab is currently free.</span>`;
+            const freeText = (labFilter && labFilter.value === 'all') ? 'All labs are currently free.' : 'The lab is currently free.';
+            statusEl.innerHTML = `<span class="status-icon">✅</span> <span class="status-text">${freeText}</span>`;
         }
     }
 
@@ -191,7 +200,9 @@ document.addEventListener('DOMContentLoaded', function() {
             
         recentBookings.forEach(booking => {
             const row = document.createElement('tr');
-            row.innerHTML = `
+            // Kolom Lab hanya ada jika lebih dari satu lab dikonfigurasi
+            const labCell = labFilter ? `<td>${booking['Lab Name'] || ''}</td>` : '';
+            row.innerHTML = `${labCell}
                 <td>${booking['Nama'] || ''}</td>
                 <td>${booking['Tanggal Booking'] || ''}</td>
                 <td>${(booking['Waktu Mulai'] || '')} - ${(booking['Waktu Selesai'] || '')}</td>
@@ -339,7 +350,8 @@ document.addEventListener('DOMContentLoaded', function() {
                     const item = document.createElement('div');
                     const start = b['Waktu Mulai'] || '';
                     const end = b['Waktu Selesai'] || '';
-                    const fullText = `${start} — ${end} ${b['Nama'] || ''}`.trim();
+                    const labPrefix = labFilter ? `[${b['Lab Name'] || ''}] ` : '';
+                    const fullText = `${labPrefix}${start} — ${end} ${b['Nama'] || ''}`.trim();
                     const displayText = truncateText(fullText, maxTextLength);
                     item.textContent = displayText;
                     item.title = fullText;
@@ -379,6 +391,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     updateDashboard();
     setInterval(updateDashboard, 30000);
+    if (labFilter) labFilter.addEventListener('change', updateDashboard);
 
     // Re-render calendar on window resize to update text truncation
     window.addEventListener('resize', () => {
@@ -8,7 +8,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const emailInput = document.getElementById('emailPengguna');
     const waInput = document.getElementById('waNumber');
     
-    // Input Waktu
+    // Input Ruangan & Waktu
+    const roomInput = document.getElementById('roomId');
     const pickupInput = document.getElementById('pickupDateTime');
     const returnInput = document.getElementById('returnDateTime');
 
@@ -42,7 +43,7 @@ document.addEventListener('DOMContentLoaded', () => {
         statusMessage.className = 'status-processing';
         
         try {
-            const response = await fetch(`/api/getEquipmentAvailability?pickup=${pickup}&return_date=${returnDate}`);
+            const response = await fetch(`/api/getEquipmentAvailability?pickup=${pickup}&return_date=${returnDate}&room=${encodeURIComponent(roomInput.value)}`);
             const result = await response.json();
 
             if (result.status === 'sukses') {
@@ -235,6 +236,8 @@ document.addEventListener('DOMContentLoaded', () => {
     // Panggil API saat tanggal/waktu berubah
     pickupInput.addEventListener('change', fetchEquipmentAvailability);
     returnInput.addEventListener('change', fetchEquipmentAvailability);
+    // Stok dihitung per ruangan, jadi muat ulang saat ruangan diganti
+    roomInput.addEventListener('change', fetchEquipmentAvailability);
     
     // Atur tanggal minimum 'return' berdasarkan tanggal 'pickup'
     pickupInput.addEventListener('change', () => {
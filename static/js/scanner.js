@@ -6,6 +6,7 @@ document.addEventListener('DOMContentLoaded', function () {
     let lastScanTime = 0;
     const cooldown = 5000;
     let currentBookingId = null;
+    let currentLabId = null;
 
     function onScanSuccess(decodedText, decodedResult) {
         const now = Date.now();
@@ -20,6 +21,7 @@ document.addEventListener('DOMContentLoaded', function () {
         try {
             const url = new URL(decodedText);
             currentBookingId = url.searchParams.get("id");
+            currentLabId = url.searchParams.get("lab");
             if (!currentBookingId) throw new Error("ID tidak valid.");
         } catch (e) {
             resultContainer.innerHTML = `❌ QR Code tidak valid.`;
@@ -62,7 +64,8 @@ document.addEventListener('DOMContentLoaded', function () {
         this.innerText = 'Processing...';
 
         // PERBAIKAN: Menggunakan URL relatif untuk checkout
-        const checkoutUrl = `/checkout?id=${currentBookingId}`;
+        let checkoutUrl = `/checkout?id=${currentBookingId}`;
+        if (currentLabId) checkoutUrl += `&lab=${encodeURIComponent(currentLabId)}`;
 
         fetch(checkoutUrl)
             .then(response => {
@@ -6,6 +6,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const namaInput = document.getElementById('nama');
     const idInput = document.getElementById('idPengguna');
     const emailInput = document.getElementById('emailPengguna');
+    const labInput = document.getElementById('labId');
     const tanggalBookingInput = document.getElementById('tanggalBooking');
     const waktuMulaiSelect = document.getElementById('waktuMulai');
     const waktuSelesaiSelect = document.getElementById('waktuSelesai');
@@ -34,7 +35,7 @@ document.addEventListener('DOMContentLoaded', () => {
         submitButton.disabled = true;
         try {
             // Menggunakan URL relatif untuk Vercel
-            const response = await fetch(`/api/getBookedSlots?tanggal=${date}`);
+            const response = await fetch(`/api/getBookedSlots?tanggal=${date}&lab=${encodeURIComponent(labInput.value)}`);
             const result = await response.json();
             if (result.status === 'sukses') {
                 bookedSlotsForSelectedDate = result.data.map(slot => ({
@@ -164,6 +165,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Ambil jadwal booking saat tanggal diubah
     tanggalBookingInput.addEventListener('change', () => fetchBookedSlots(tanggalBookingInput.value));
+    // Setiap lab punya jadwal sendiri, jadi muat ulang saat lab diganti
+    labInput.addEventListener('change', () => fetchBookedSlots(tanggalBookingInput.value));
     
     // Tampilkan/sembunyikan field "Other Purpose"
     purposeSelect.addEventListener('change', () => {